@@ -6,13 +6,186 @@ Author: Rafael Borja (https://github.com/rafaelborja/)
 Modified by: [Your Name]
 """
 
+import asyncio
+import hashlib
+import io
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from bs4 import BeautifulSoup
-import os
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.dammit import EntitySubstitution
+from bs4.formatter import HTMLFormatter
 from urllib.parse import urljoin, urlparse
 import logging
+import re
 import argparse
-from xhtml2pdf import pisa
+
+try:
+    import aiohttp
+except ImportError:
+    # Optional: without aiohttp, index pages are fetched with a thread pool instead
+    aiohttp = None
+
+try:
+    import requests_cache
+except ImportError:
+    # Optional: without requests-cache, pages are downloaded again on every run
+    requests_cache = None
+
+# PDF engines; at least the one selected with --engine must be installed
+try:
+    from weasyprint import HTML
+except (ImportError, OSError):
+    # WeasyPrint raises OSError when its system libraries (Pango) are missing
+    HTML = None
+try:
+    from xhtml2pdf import pisa
+except ImportError:
+    pisa = None
+
+# Log calls use %-style arguments so nothing is formatted (including the
+# costly str() of a tag) unless the message's level is enabled
+_log = logging.getLogger(__name__)
+
+# Basic styling to improve PDF appearance, as (selectors, declarations) pairs
+_STYLE_RULES = (
+    (('body',), 'font-family: Arial, sans-serif; margin: 20px;'),
+    (('h1', 'h2', 'h3', 'h4', 'h5', 'h6'), 'color: #2c3e50;'),
+    (('p',), 'font-size: 14px; line-height: 1.6;'),
+    (('pre',), 'background-color: #f5f5f5; padding: 10px; overflow-x: auto;'),
+    (('code',), 'background-color: #f9f9f9; padding: 2px 4px;'),
+    (('table',), 'border-collapse: collapse; margin-bottom: 20px;'),
+    (('th', 'td'), 'border: 1px solid #ddd; padding: 8px;'),
+    (('th',), 'background-color: #f2f2f2;'),
+    (('img',), 'max-width: 600px; height: auto;'),
+)
+
+# Opening tag names in serialized HTML
+_TAG_RE = re.compile(r'<([a-z][a-z0-9]*)')
+
+# Combined document template, written around the extracted page contents
+_DOCUMENT_HEAD = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Combined Document</title>
+<style>{style}</style>
+</head>
+<body>
+'''
+_DOCUMENT_TAIL = '''</body>
+</html>
+'''
+
+# Connection limits for concurrent page fetching
+MAX_CONNECTIONS = 64
+MAX_CONNECTIONS_PER_HOST = 8
+MAX_WORKERS = 16
+
+# Browser-like User-Agent; many sites answer 403/429 to the python-requests default
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0'
+DEFAULT_TIMEOUT = 30
+
+# On-disk HTTP cache, so re-runs don't download every page again
+CACHE_NAME = 'site2pdf_cache'
+CACHE_EXPIRE_AFTER = 86400
+
+# Tags and attributes whose URLs are made absolute
+_URL_TAGS = frozenset(['img', 'a', 'link', 'script'])
+_URL_ATTRS = ('src', 'href')
+# References that resolve against the page itself rather than its directory (besides '')
+_PAGE_RELATIVE_PREFIXES = ('?', '#')
+
+# Inline style declarations whose value contains a percentage
+_PCT_STYLE_RE = re.compile(r'\s*[^:;]+:[^;]*%[^;]*;?')
+
+# Links with these prefixes never point to another page
+_INVALID_PREFIXES = ('#', 'mailto:', 'javascript:', 'tel:')
+
+class _ElementStrainer(SoupStrainer):
+    """
+    SoupStrainer that decides which tags to build with a function of (name, attrs).
+    """
+    def __init__(self, function):
+        # bs4 < 4.13 calls a callable name with (name, attrs) while parsing
+        super().__init__(function)
+        self._function = function
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        # bs4 >= 4.13 asks this instead, and would call the function with the name only
+        return self._function(name, attrs or {})
+
+def _has_class(class_value, class_name):
+    """
+    Matches a class attribute the way find(class_=...) does: either one of the
+    classes, or the whole attribute value (e.g. 'main content').
+    """
+    if not class_value:
+        return False
+    if not isinstance(class_value, str):
+        class_value = ' '.join(class_value)
+    return class_name == class_value or class_name in class_value.split()
+
+class _SourceOrderFormatter(HTMLFormatter):
+    """
+    BeautifulSoup's 'minimal' formatter without the per-tag attribute sort.
+    """
+    def attributes(self, tag):
+        return tag.attrs.items()
+
+# Built once and reused for serializing every page
+_FORMATTER = _SourceOrderFormatter(entity_substitution=EntitySubstitution.substitute_xml)
+
+@lru_cache(maxsize=4096)
+def _urljoin(base, url):
+    """
+    Cached urljoin; pages repeat the same base and often the same references.
+    """
+    return urljoin(base, url)
+
+@lru_cache(maxsize=8192)
+def _parse(url):
+    """
+    Cached urlparse; index pages often link to the same URLs many times.
+    """
+    return urlparse(url)
+
+def _build_style(tags_present):
+    """
+    Builds a minified style sheet with only the rules whose selectors appear in the document.
+    """
+    rules = []
+    for selectors, declarations in _STYLE_RULES:
+        used = [selector for selector in selectors if selector in tags_present or selector == 'body']
+        if used:
+            rules.append('{}{{{}}}'.format(','.join(used), declarations.replace(': ', ':').replace('; ', ';')))
+    return ''.join(rules)
+
+def _rewrite_urls(main_content, base, page_relative_only=False):
+    """
+    Makes the src/href of images, links, stylesheets and scripts absolute against base.
+
+    With page_relative_only, only empty, query-only and fragment-only references are
+    rewritten; these are the ones that depend on the page itself rather than its directory.
+    Returns True if any value changed.
+    """
+    changed = False
+    for tag in main_content.descendants:
+        if getattr(tag, 'name', None) not in _URL_TAGS:
+            continue
+        for attr in _URL_ATTRS:
+            old_value = tag.attrs.get(attr)
+            if old_value is None:
+                continue
+            if not page_relative_only or not old_value or old_value.startswith(_PAGE_RELATIVE_PREFIXES):
+                new_value = _urljoin(base, old_value)
+                if new_value != old_value:
+                    tag[attr] = new_value
+                    changed = True
+                    _log.debug('Updated %s from %s to %s in tag %s', attr, old_value, new_value, tag)
+    return changed
 
 def main():
     # Set up argument parser
@@ -21,6 +194,10 @@ def main():
     parser.add_argument('--content_class', required=True, help='Class of the content to include in the PDF')
     parser.add_argument('--filename', required=True, help='Name of the output PDF file')
     parser.add_argument('--log-level', default='INFO', help='Set the logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help=f'Timeout in seconds for each page request (default: {DEFAULT_TIMEOUT})')
+    parser.add_argument('--engine', choices=['weasyprint', 'pisa'], default='weasyprint', help='PDF engine to use: weasyprint (default) or pisa (xhtml2pdf)')
+    parser.add_argument('--user-agent', default=DEFAULT_USER_AGENT, help='User-Agent header sent with each request')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the on-disk HTTP cache; index pages are then fetched with aiohttp if it is installed')
 
     # Mutually exclusive group for index_id and next_page_class
     group = parser.add_mutually_exclusive_group(required=True)
@@ -29,6 +206,11 @@ def main():
 
     args = parser.parse_args()
 
+    if args.engine == 'weasyprint' and HTML is None:
+        parser.error('WeasyPrint is not available (not installed or missing system libraries); install it or use --engine pisa')
+    if args.engine == 'pisa' and pisa is None:
+        parser.error('xhtml2pdf is not installed; install it or use --engine weasyprint')
+
     # Configure logging
     numeric_level = getattr(logging, args.log_level.upper(), None)
     if not isinstance(numeric_level, int):
@@ -36,121 +218,262 @@ def main():
     logging.basicConfig(level=numeric_level, format='%(asctime)s - %(levelname)s - %(message)s')
 
     # Base URL
-    base_url = '{uri.scheme}://{uri.netloc}'.format(uri=urlparse(args.url))
+    base_url = '{uri.scheme}://{uri.netloc}'.format(uri=_parse(args.url))
+    base_netloc = _parse(base_url).netloc
+    # Directory of the start page, which relative URLs in the final document resolve against
+    document_dir = _urljoin(args.url, '.')
+
+    # Serve repeated runs from the on-disk cache when available
+    use_cache = requests_cache is not None and not args.no_cache
+    if use_cache:
+        session = requests_cache.CachedSession(CACHE_NAME, backend='sqlite', expire_after=CACHE_EXPIRE_AFTER)
+    else:
+        session = requests.Session()
+
+    # Reuse connections across requests (keep-alive) and retry transient failures.
+    # Read timeouts are not retried, so --timeout bounds each page and surfaces as requests.Timeout
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=64,
+        max_retries=Retry(total=3, read=False, backoff_factor=0.5)
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'User-Agent': args.user_agent})
 
     # Initialize a set to keep track of visited URLs to avoid duplicates
     visited_urls = set()
 
-    # Initialize a list to keep track of content
-    html_contents = []
+    # Combined document, written page by page as content is extracted
+    html_buffer = io.StringIO()
+    pages_added = 0
+    # Tag names used across all pages, to drop unused style rules
+    tags_present = set()
+    # Digests of added contents, to skip pages identical to an earlier one
+    content_digests = set()
+
+    def add_content(content, digest, url):
+        """
+        Appends the extracted content of a page to the combined document, unless
+        content with the same digest was already added.
+        """
+        nonlocal pages_added
+        if digest in content_digests:
+            _log.debug('Skipping duplicate content from %s', url)
+            return
+        content_digests.add(digest)
+        tags_present.update(_TAG_RE.findall(content))
+        html_buffer.write(content)
+        html_buffer.write('\n')
+        pages_added += 1
+        _log.debug('Added content from %s', url)
+
+    def keep_element(name, attrs):
+        """
+        SoupStrainer filter that keeps only the content, index and next-link elements.
+        """
+        class_value = attrs.get('class')
+        if name == 'div' and _has_class(class_value, args.content_class):
+            return True
+        if args.index_id and attrs.get('id') == args.index_id:
+            return True
+        return bool(args.next_page_class) and name == 'a' and _has_class(class_value, args.next_page_class)
+
+    # Only build the subtrees we actually use instead of the whole page
+    strainer = _ElementStrainer(keep_element)
+
+    def parse_html(content, encoding=None):
+        """
+        Parses raw page content into a BeautifulSoup object.
+        """
+        return BeautifulSoup(content, 'lxml', parse_only=strainer, from_encoding=encoding)
 
     def fetch_and_parse(url):
         """
         Fetches the content of the URL and returns a BeautifulSoup object.
         """
-        logging.debug(f'Fetching {url}')
-        response = requests.get(url)
+        _log.debug('Fetching %s', url)
+        response = session.get(url, timeout=args.timeout)
         response.raise_for_status()
-        logging.debug(f'Successfully fetched {url}')
-        return BeautifulSoup(response.content, 'html.parser')
+        _log.debug('Successfully fetched %s', url)
+        # Only trust the declared charset; requests falls back to ISO-8859-1 for
+        # text/* responses without one, which would override a <meta charset>.
+        encoding = response.encoding if 'charset' in response.headers.get('content-type', '').lower() else None
+        return parse_html(response.content, encoding)
+
+    async def fetch_and_parse_async(session, semaphore, url):
+        """
+        Fetches the content of the URL with aiohttp and returns a BeautifulSoup object.
+        """
+        # Wait for a free slot before sending, so a queued page never holds a request open
+        async with semaphore:
+            _log.debug('Fetching %s', url)
+            # The timeout covers only this request, not the time spent queued for a slot
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=args.timeout)) as response:
+                response.raise_for_status()
+                content = await response.read()
+                encoding = response.charset
+        _log.debug('Successfully fetched %s', url)
+        return parse_html(content, encoding)
 
     def is_valid_link(href):
         """
-        Checks if the href is a valid link (not an anchor link).
+        Checks if the href is a valid link (not an anchor, mailto, javascript or tel link).
         """
-        return href and not href.startswith('#') and not href.startswith('mailto:')
+        return href and not href.startswith(_INVALID_PREFIXES)
 
     def process_links(container, current_url):
         """
         Processes the links inside the given container element.
+
+        Pages are fetched concurrently; their content is appended in link order.
         """
         # Find all 'a' tags within this element
         link_elements = container.find_all('a', href=True)
-        logging.debug(f'Found {len(link_elements)} links in the container')
+        _log.debug('Found %s links in the container', len(link_elements))
 
+        urls = []
         for link in link_elements:
             href = link.get('href')
             if is_valid_link(href):
                 # Construct full URL
                 full_url = urljoin(current_url, href)
                 # Ensure we stay within the base domain
-                if urlparse(full_url).netloc == urlparse(base_url).netloc:
-                    logging.debug(f'Found link to {full_url} in {current_url}')
-                    process_page(full_url)
+                if _parse(full_url).netloc == base_netloc:
+                    _log.debug('Found link to %s in %s', full_url, current_url)
+                    if full_url in visited_urls:
+                        _log.debug('Already visited %s', full_url)
+                        continue
+                    visited_urls.add(full_url)
+                    urls.append(full_url)
                 else:
-                    logging.debug(f'Skipping external link {full_url}')
+                    _log.debug('Skipping external link %s', full_url)
             else:
-                logging.debug(f'Ignoring invalid link {href}')
+                _log.debug('Ignoring invalid link %s', href)
 
-    def process_page(url):
+        # Both paths return results in submission order, which keeps the PDF in index order
+        # aiohttp would bypass the HTTP cache, so cached runs go through the requests session
+        if aiohttp is not None and not use_cache:
+            results = asyncio.run(fetch_pages_async(urls))
+        else:
+            _log.debug('Fetching %s pages with %s threads', len(urls), MAX_WORKERS)
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                results = list(executor.map(fetch_and_extract, urls))
+
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                _log.error('Failed to process %s: %s', url, result)
+                continue
+            _, extracted = result
+            if extracted is not None:
+                add_content(*extracted, url)
+
+    async def fetch_pages_async(urls):
         """
-        Processes a page: fetches content, extracts main content.
+        Fetches and extracts the given pages concurrently over a single aiohttp session.
         """
-        if url in visited_urls:
-            logging.debug(f'Already visited {url}')
-            return
-        visited_urls.add(url)
-        logging.info(f'Processing {url}')
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=MAX_CONNECTIONS_PER_HOST)
+        async with aiohttp.ClientSession(
+            connector=connector,
+            headers={'User-Agent': args.user_agent}
+        ) as session:
+            semaphore = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+            return await asyncio.gather(*(fetch_and_extract_async(session, semaphore, url) for url in urls), return_exceptions=True)
+
+    async def fetch_and_extract_async(session, semaphore, url):
+        """
+        Processes a page with aiohttp and returns a (url, extracted) tuple.
+        """
+        _log.info('Processing %s', url)
+        try:
+            soup = await fetch_and_parse_async(session, semaphore, url)
+        except asyncio.TimeoutError:
+            _log.error('Timed out after %ss fetching %s', args.timeout, url)
+            return url, None
+        except Exception as e:
+            _log.error('Failed to fetch %s: %s', url, e)
+            return url, None
+        return url, extract_content(soup, url)
+
+    def fetch_and_extract(url):
+        """
+        Processes a page with the shared requests session and returns a (url, extracted) tuple.
+        """
+        _log.info('Processing %s', url)
         try:
             soup = fetch_and_parse(url)
+        except requests.Timeout:
+            _log.error('Timed out after %ss fetching %s', args.timeout, url)
+            return url, None
         except Exception as e:
-            logging.error(f'Failed to fetch {url}: {e}')
-            return
+            _log.error('Failed to fetch %s: %s', url, e)
+            return url, None
+        return url, extract_content(soup, url)
 
-        # Extract main content
+    def extract_content(soup, url):
+        """
+        Extracts the main content of a parsed page and returns a (content, digest) tuple,
+        or None if the page has no element with the content class.
+
+        The digest is taken before URLs are rewritten, so identical pages reached
+        through different URLs still compare equal.
+        """
         main_content = soup.find('div', class_=args.content_class)
-        if main_content:
-            # Fix relative links for images and other resources
-            for tag in main_content.find_all(['img', 'a', 'link', 'script']):
-                for attr in ['src', 'href']:
-                    if tag.has_attr(attr):
-                        old_value = tag[attr]
-                        tag[attr] = urljoin(url, tag[attr])
-                        logging.debug(f'Updated {attr} from {old_value} to {tag[attr]} in tag {tag}')
-
-            # Remove or convert percentage values in attributes and styles
+        if not main_content:
+            _log.warning('No content with class "%s" found at %s', args.content_class, url)
+            return None
+
+        content = main_content.decode(formatter=_FORMATTER)
+        digest = hashlib.sha1(content.encode('utf-8')).digest()
+
+        # Fix relative links for images and other resources
+        # WeasyPrint resolves relative URLs against the start page itself, so the
+        # rewrite is only needed where that would give a different result
+        if args.engine == 'pisa' or _urljoin(url, '.') != document_dir:
+            changed = _rewrite_urls(main_content, url)
+        elif url != args.url:
+            # Path references resolve the same from the start page's directory;
+            # '?query', '#fragment' and empty references still need this page
+            changed = _rewrite_urls(main_content, url, page_relative_only=True)
+        else:
+            changed = False
+
+        # Remove percentage values in attributes and styles, which xhtml2pdf cannot handle
+        if args.engine == 'pisa':
             clean_html(main_content)
+            changed = True
 
-            html_contents.append(str(main_content))
-            logging.debug(f'Added content from {url}')
-        else:
-            logging.warning(f'No content with class "{args.content_class}" found at {url}')
+        # Serialize again only if the tree was modified
+        if changed:
+            content = main_content.decode(formatter=_FORMATTER)
+        return content, digest
 
-    def process_next_pages(start_url):
+    def process_next_pages(start_url, start_soup):
         """
         Navigates through pages using the 'next' link found in elements with the specified class.
+        The start page has already been fetched and parsed into start_soup.
         """
         current_url = start_url
+        soup = start_soup
         while True:
             if current_url in visited_urls:
-                logging.debug(f'Already visited {current_url}')
+                _log.debug('Already visited %s', current_url)
                 break
             visited_urls.add(current_url)
-            logging.info(f'Processing {current_url}')
-            try:
-                soup = fetch_and_parse(current_url)
-            except Exception as e:
-                logging.error(f'Failed to fetch {current_url}: {e}')
-                break
+            _log.info('Processing %s', current_url)
+            if soup is None:
+                try:
+                    soup = fetch_and_parse(current_url)
+                except requests.Timeout:
+                    _log.error('Timed out after %ss fetching %s', args.timeout, current_url)
+                    break
+                except Exception as e:
+                    _log.error('Failed to fetch %s: %s', current_url, e)
+                    break
 
-            # Extract main content
-            main_content = soup.find('div', class_=args.content_class)
-            if main_content:
-                # Fix relative links for images and other resources
-                for tag in main_content.find_all(['img', 'a', 'link', 'script']):
-                    for attr in ['src', 'href']:
-                        if tag.has_attr(attr):
-                            old_value = tag[attr]
-                            tag[attr] = urljoin(current_url, tag[attr])
-                            logging.debug(f'Updated {attr} from {old_value} to {tag[attr]} in tag {tag}')
-
-                # Remove or convert percentage values in attributes and styles
-                clean_html(main_content)
-
-                html_contents.append(str(main_content))
-                logging.debug(f'Added content from {current_url}')
-            else:
-                logging.warning(f'No content with class "{args.content_class}" found at {current_url}')
+            extracted = extract_content(soup, current_url)
+            if extracted is not None:
+                add_content(*extracted, current_url)
 
             # Find the next link
             next_link_element = soup.find('a', class_=args.next_page_class)
@@ -159,18 +482,19 @@ def main():
                 if is_valid_link(href):
                     next_url = urljoin(current_url, href)
                     # Ensure we stay within the base domain
-                    if urlparse(next_url).netloc == urlparse(base_url).netloc:
-                        logging.debug(f'Next link found: {next_url}')
+                    if _parse(next_url).netloc == base_netloc:
+                        _log.debug('Next link found: %s', next_url)
                         current_url = next_url
+                        soup = None
                         continue
                     else:
-                        logging.debug(f'Skipping external next link {next_url}')
+                        _log.debug('Skipping external next link %s', next_url)
                         break
                 else:
-                    logging.debug(f'Ignoring invalid next link {href}')
+                    _log.debug('Ignoring invalid next link %s', href)
                     break
             else:
-                logging.info('No next link found. Ending navigation.')
+                _log.info('No next link found. Ending navigation.')
                 break
 
     def clean_html(content):
@@ -178,140 +502,107 @@ def main():
         Removes percentage values from all attributes and styles.
         """
         for tag in content.find_all():
+            # Clean up inline styles first, so declarations without percentages are kept
+            original_style = tag.attrs.get('style')
+            if original_style is not None and '%' in original_style:
+                new_style = _PCT_STYLE_RE.sub('', original_style).strip().rstrip(';')
+                if not new_style:
+                    del tag['style']
+                elif new_style != original_style:
+                    tag['style'] = new_style
+                    _log.debug('Updated style from "%s" to "%s" in tag %s', original_style, new_style, tag)
+
             # Remove attributes with percentage values
+            if '%' not in repr(tag.attrs):
+                continue
             attrs_to_remove = []
             for attr, value in tag.attrs.items():
                 if isinstance(value, list):
                     value = ' '.join(value)
                 if '%' in str(value):
-                    logging.debug(f'Removing attribute {attr} with percentage value from tag {tag}')
+                    _log.debug('Removing attribute %s with percentage value from tag %s', attr, tag)
                     attrs_to_remove.append(attr)
             for attr in attrs_to_remove:
                 del tag[attr]
 
-            # Clean up inline styles
-            if tag.has_attr('style'):
-                original_style = tag['style']
-                styles = tag['style'].split(';')
-                new_styles = []
-                for style in styles:
-                    if style.strip():
-                        prop, _, val = style.partition(':')
-                        prop = prop.strip()
-                        val = val.strip()
-                        if '%' in val:
-                            logging.debug(f'Removing style "{style}" from tag {tag}')
-                            continue
-                        new_styles.append(f'{prop}: {val}')
-                if new_styles:
-                    tag['style'] = '; '.join(new_styles)
-                    if tag['style'] != original_style:
-                        logging.debug(f'Updated style from "{original_style}" to "{tag['style']}" in tag {tag}')
-                else:
-                    del tag['style']
-
     # Start processing from the start URL
-    logging.info(f'Starting processing from {args.url}')
     try:
-        soup = fetch_and_parse(args.url)
-    except Exception as e:
-        logging.error(f'Failed to fetch start URL {args.url}: {e}')
-        exit(1)
-
-    # Determine which processing method to use
-    if args.next_page_class:
-        # Process pages by following 'next' links
-        process_next_pages(args.url)
-    elif args.index_id:
-        # Include the content from the start page first
-        main_content = soup.find('div', class_=args.content_class)
-        if main_content:
-            # Fix relative links for images and other resources
-            for tag in main_content.find_all(['img', 'a', 'link', 'script']):
-                for attr in ['src', 'href']:
-                    if tag.has_attr(attr):
-                        old_value = tag[attr]
-                        tag[attr] = urljoin(args.url, tag[attr])
-                        logging.debug(f'Updated {attr} from {old_value} to {tag[attr]} in tag {tag}')
-
-            # Remove or convert percentage values in attributes and styles
-            clean_html(main_content)
+        _log.info('Starting processing from %s', args.url)
+        try:
+            soup = fetch_and_parse(args.url)
+        except requests.Timeout:
+            _log.error('Timed out after %ss fetching start URL %s', args.timeout, args.url)
+            exit(1)
+        except Exception as e:
+            _log.error('Failed to fetch start URL %s: %s', args.url, e)
+            exit(1)
 
-            html_contents.append(str(main_content))
-            logging.debug(f'Added content from start URL')
+        # Determine which processing method to use
+        if args.next_page_class:
+            # Process pages by following 'next' links
+            process_next_pages(args.url, soup)
+        elif args.index_id:
+            # Include the content from the start page first
+            extracted = extract_content(soup, args.url)
+            if extracted is not None:
+                add_content(*extracted, args.url)
+
+            # Now process the links inside the specified element
+            container = soup.find(id=args.index_id)
+            if not container:
+                _log.error("No element found with id '%s' on %s", args.index_id, args.url)
+                exit(1)
+
+            process_links(container, args.url)
         else:
-            logging.warning(f'No content with class "{args.content_class}" found at start URL {args.url}')
-
-        # Now process the links inside the specified element
-        container = soup.find(id=args.index_id)
-        if not container:
-            logging.error(f"No element found with id '{args.index_id}' on {args.url}")
+            _log.error('Either --index_id or --next_page_class must be provided.')
             exit(1)
+    finally:
+        session.close()
 
-        process_links(container, args.url)
-    else:
-        logging.error('Either --index_id or --next_page_class must be provided.')
+    if not pages_added:
+        _log.error('No content was collected. Exiting.')
         exit(1)
 
-    if not html_contents:
-        logging.error('No content was collected. Exiting.')
-        exit(1)
+    # Wrap the buffered page contents with the head and the styles they need
+    _log.info('Combining content into a single HTML document')
+    html_content = ''.join((
+        _DOCUMENT_HEAD.format(style=_build_style(tags_present)),
+        html_buffer.getvalue(),
+        _DOCUMENT_TAIL
+    ))
 
-    # Combine all HTML content into a single HTML string
-    logging.info('Combining content into a single HTML document')
-    html_content = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <title>Combined Document</title>
-        <style>
-            /* Add basic styling to improve PDF appearance */
-            body {{ font-family: Arial, sans-serif; margin: 20px; }}
-            h1, h2, h3, h4, h5, h6 {{ color: #2c3e50; }}
-            p {{ font-size: 14px; line-height: 1.6; }}
-            pre {{ background-color: #f5f5f5; padding: 10px; overflow-x: auto; }}
-            code {{ background-color: #f9f9f9; padding: 2px 4px; }}
-            table {{ border-collapse: collapse; margin-bottom: 20px; }}
-            th, td {{ border: 1px solid #ddd; padding: 8px; }}
-            th {{ background-color: #f2f2f2; }}
-            img {{ max-width: 600px; height: auto; }}
-        </style>
-    </head>
-    <body>
-    {content}
-    </body>
-    </html>
-    '''.format(content='\n'.join(html_contents))
-
-    # Convert the combined HTML to PDF using xhtml2pdf
-    logging.info(f'Converting combined HTML to {args.filename}')
-    try:
+    # Keep the combined HTML on disk only when debugging
+    if _log.isEnabledFor(logging.DEBUG):
         with open('combined.html', 'w', encoding='utf-8') as f:
             f.write(html_content)
-        with open('combined.html', 'r', encoding='utf-8') as f:
-            source_html = f.read()
-        with open(args.filename, 'wb') as output_file:
-            pisa_status = pisa.CreatePDF(
-                src=source_html,
-                dest=output_file,
-                encoding='utf-8',
-                link_callback=lambda uri, rel: urljoin(base_url, uri),
-                debug=True
-            )
-        if pisa_status.err:
-            logging.error(f'Failed to generate PDF: {pisa_status.err}')
-        else:
-            logging.info(f'Successfully generated {args.filename}')
-    except Exception as e:
-        logging.error(f'Exception occurred during PDF generation: {e}', exc_info=True)
-    finally:
-        # Clean up the temporary HTML file
+        _log.debug('Wrote combined HTML to combined.html')
+
+    _log.info('Converting combined HTML to %s using %s', args.filename, args.engine)
+    if args.engine == 'weasyprint':
         try:
-            os.remove('combined.html')
-            logging.debug(f'Removed temporary file combined.html')
+            # Relative URLs left in pages from the start page's directory resolve against it
+            HTML(string=html_content, base_url=args.url).write_pdf(args.filename)
+            _log.info('Successfully generated %s', args.filename)
+        except Exception as e:
+            _log.error('Exception occurred during PDF generation: %s', e, exc_info=True)
+    else:
+        # Convert the combined HTML to PDF using xhtml2pdf
+        try:
+            with open(args.filename, 'wb') as output_file:
+                pisa_status = pisa.CreatePDF(
+                    src=html_content,
+                    dest=output_file,
+                    encoding='utf-8',
+                    link_callback=lambda uri, rel: _urljoin(base_url, uri),
+                    debug=True
+                )
+            if pisa_status.err:
+                _log.error('Failed to generate PDF: %s', pisa_status.err)
+            else:
+                _log.info('Successfully generated %s', args.filename)
         except Exception as e:
-            logging.warning(f'Failed to remove temporary file combined.html: {e}')
+            _log.error('Exception occurred during PDF generation: %s', e, exc_info=True)
 
 if __name__ == '__main__':
     main()